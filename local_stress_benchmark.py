@@ -1,21 +1,45 @@
 import random
 import re
-from copy import deepcopy
 
 from benchmark import BENCHMARKS, compute_f1, compute_total_score
 from main import generate_hybrid
 
+try:
+    from tqdm import tqdm
+except Exception:
+    tqdm = None
+
+
+# Precompiled perturbation machinery: each variant walks the string once in C
+# instead of chaining Python-level str.replace scans per case.
+_PERTURB_REPLACEMENTS = {
+    "What's": "What is",
+    "How's": "How is",
+    "Send a message": "Text",
+    "Find": "Look up",
+}
+_CONTRACTION_RE = re.compile(r"What's|How's")
+_REPHRASE_RE = re.compile(r"Send a message|Find")
+_AND_RE = re.compile(r" and ")
+_WS_RE = re.compile(r"\s+")
+
+
+def _sub_replacement(match):
+    return _PERTURB_REPLACEMENTS[match.group(0)]
+
+
+_PERTURB_VARIANTS = (
+    lambda s: s,
+    lambda s: _CONTRACTION_RE.sub(_sub_replacement, s),
+    lambda s: _REPHRASE_RE.sub(_sub_replacement, s),
+    lambda s: _AND_RE.sub(", and ", s),
+    lambda s: _WS_RE.sub(" ", s).strip(),
+    lambda s: s.rstrip(".") + " please.",
+)
+
 
 def perturb_text(text, rng):
-    variants = [
-        lambda s: s,
-        lambda s: s.replace("What's", "What is").replace("How's", "How is"),
-        lambda s: s.replace("Send a message", "Text").replace("Find", "Look up"),
-        lambda s: s.replace(" and ", ", and "),
-        lambda s: re.sub(r"\s+", " ", s).strip(),
-        lambda s: s.rstrip(".") + " please.",
-    ]
-    out = rng.choice(variants)(text)
+    out = rng.choice(_PERTURB_VARIANTS)(text)
     if rng.random() < 0.25:
         out = "Hey assistant, " + out[0].lower() + out[1:]
     return out
@@ -26,8 +50,15 @@ def build_stress_cases(multiplier=4, seed=42):
     cases = []
     for case in BENCHMARKS:
         for idx in range(multiplier):
-            clone = deepcopy(case)
-            clone["name"] = f"{case['name']}_stress_{idx+1}"
+            # Only message contents are mutated, so tools/expected_calls can be
+            # shared by reference instead of deep-copying the schema trees.
+            clone = {
+                "name": f"{case['name']}_stress_{idx+1}",
+                "difficulty": case["difficulty"],
+                "tools": case["tools"],
+                "expected_calls": case["expected_calls"],
+                "messages": [dict(m) for m in case["messages"]],
+            }
             for msg in clone["messages"]:
                 if msg.get("role") == "user":
                     msg["content"] = perturb_text(msg["content"], rng)
@@ -39,7 +70,8 @@ def run_local_stress(multiplier=4, seed=42):
     cases = build_stress_cases(multiplier=multiplier, seed=seed)
     results = []
     print(f"Running stress benchmark on {len(cases)} cases...")
-    for i, case in enumerate(cases, 1):
+    progress = tqdm(cases, desc="stress") if tqdm is not None else cases
+    for i, case in enumerate(progress, 1):
         result = generate_hybrid(case["messages"], case["tools"])
         f1 = compute_f1(result.get("function_calls", []), case["expected_calls"])
         results.append({
@@ -49,7 +81,7 @@ def run_local_stress(multiplier=4, seed=42):
             "f1": f1,
             "source": result.get("source", "unknown"),
         })
-        if i % 20 == 0:
+        if tqdm is None and i % 20 == 0:
             print(f"  {i}/{len(cases)} done...")
 
     avg_f1 = sum(r["f1"] for r in results) / len(results)
@@ -39,6 +39,17 @@ TOOLS = [
 ]
 
 
+# Canned transcripts for running the demo without a microphone or the Cactus
+# whisper binding. Routing results for these are deterministic, and repeated
+# routes within one process hit generate_hybrid's result cache.
+SAMPLE_QUERIES = (
+    "Set an alarm for 7:30 am",
+    "Send a message to Alice saying I'm running late",
+    "Wake me up at 6 am",
+    "Text Bob that dinner is at 8",
+)
+
+
 def execute_tool(call):
     name = call.get("name")
     args = call.get("arguments", {})
@@ -62,14 +73,8 @@ def transcribe_audio(audio_path: Path):
         cactus_destroy(whisper_model)
 
 
-def main():
-    audio = Path("sample.wav")
-    if not audio.exists():
-        raise FileNotFoundError("Expected sample.wav in current directory")
-
-    transcript = transcribe_audio(audio)
+def route_and_execute(transcript):
     print(f"Transcript: {transcript}")
-
     messages = [{"role": "user", "content": transcript}]
     routed = generate_hybrid(messages, TOOLS)
     print(f"Route source: {routed.get('source')} | confidence={routed.get('confidence', 0):.3f}")
@@ -78,5 +83,18 @@ def main():
         execute_tool(call)
 
 
+def main():
+    audio = Path("sample.wav")
+    if cactus_init and audio.exists():
+        route_and_execute(transcribe_audio(audio))
+        return
+
+    # No audio path available: simulate the voice loop over canned transcripts.
+    print("sample.wav or Cactus transcription unavailable; routing sample queries instead.\n")
+    for transcript in SAMPLE_QUERIES:
+        route_and_execute(transcript)
+        print()
+
+
 if __name__ == "__main__":
     main()